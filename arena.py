@@ -1,45 +1,127 @@
+import functools
 import gradio as gr
+import html
 import os
-import random
+import tempfile
+from itertools import islice
 from pathlib import Path
 import pandas as pd
-from collections import defaultdict
+import numpy as np
+import networkx as nx
+from sortedcontainers import SortedList
+
+rng = np.random.default_rng()
+RANKING_TOP_K = 50  # rows shown in the live ELO ranking table; the export button writes all players
+VOTE_QUEUE_LIMIT = 10  # upcoming matches listed (and voteable) in the keyboard vote queue
+
+# --- Shared Gradio updates (never mutated, only reassigned into output slots) ---
+NOOP = gr.update()
+SHOW = gr.update(visible=True)
+HIDE = gr.update(visible=False)
+NOOP12 = (NOOP,) * 12
+HIDE11 = (HIDE,) * 11
 
 # --- JavaScript for custom video controls ---
 js_script = """
 async function() {
-    await new Promise(r => setTimeout(r, 100));
-    const left_video_container = document.querySelector("#left-media-display");
-    const right_video_container = document.querySelector("#right-media-display");
-    if (!left_video_container || !right_video_container) return;
-    const left_video = left_video_container.querySelector("video");
-    const right_video = right_video_container.querySelector("video");
+    const waitFor = (sel, timeout = 2000) => new Promise(res => {
+        const el = document.querySelector(sel);
+        if (el) return res(el);
+        const observer = new MutationObserver(() => { const e = document.querySelector(sel); if (e) { observer.disconnect(); res(e); } });
+        observer.observe(document.body, { childList: true, subtree: true });
+        setTimeout(() => { observer.disconnect(); res(null); }, timeout);
+    });
+    const [left_video, right_video] = await Promise.all([waitFor("#left-media-display video"), waitFor("#right-media-display video")]);
     if (!left_video || !right_video) return;
     const controls_container = document.querySelector("#custom-video-controls");
     if (!controls_container) return; 
     const play_pause_btn = document.getElementById("play-pause-btn");
     const slider = document.getElementById("timeline-slider");
-    play_pause_btn.textContent = "▶️ 同步播放";
-    slider.value = 0;
+    // The controls are recreated whenever they are hidden and shown again, so their on* handlers are
+    // (re)assigned on every run; assigning a property replaces the old handler and cannot leak.
+    play_pause_btn.textContent = left_video.paused ? "▶️ 同步播放" : "⏸️ 同步暫停";
+    if (left_video.duration) slider.max = left_video.duration;
+    slider.value = left_video.currentTime || 0;
     play_pause_btn.onclick = () => {
         if (left_video.paused) { left_video.play(); right_video.play(); } 
         else { left_video.pause(); right_video.pause(); }
     };
-    let is_seeking = false;
-    const onTimeUpdate = () => { if (!is_seeking && !left_video.paused) slider.value = left_video.currentTime; };
-    const onLoadedMetadata = () => { slider.max = left_video.duration; };
+    slider.oninput = () => { left_video.arenaSeeking = true; const time = slider.value; left_video.currentTime = time; right_video.currentTime = time; };
+    slider.onchange = () => { left_video.arenaSeeking = false; };
+    // Gradio reuses the <video> nodes between matches; add their listeners only once per node.
+    // The listeners look the controls up on each event so they keep working after the controls are recreated.
+    if (left_video.dataset.arenaBound === "1") return;
+    left_video.dataset.arenaBound = "1";
+    const onTimeUpdate = () => {
+        const current_slider = document.getElementById("timeline-slider");
+        if (current_slider && !left_video.arenaSeeking && !left_video.paused) current_slider.value = left_video.currentTime;
+    };
+    const onLoadedMetadata = () => { const current_slider = document.getElementById("timeline-slider"); if (current_slider) current_slider.max = left_video.duration; };
     left_video.addEventListener('loadedmetadata', onLoadedMetadata);
     left_video.addEventListener('timeupdate', onTimeUpdate);
-    slider.oninput = () => { is_seeking = true; const time = slider.value; left_video.currentTime = time; right_video.currentTime = time; };
-    slider.onchange = () => { is_seeking = false; };
-    const updateButtonText = () => { play_pause_btn.textContent = left_video.paused ? "▶️ 同步播放" : "⏸️ 同步暫停"; };
+    const updateButtonText = () => {
+        const current_btn = document.getElementById("play-pause-btn");
+        if (current_btn) current_btn.textContent = left_video.paused ? "▶️ 同步播放" : "⏸️ 同步暫停";
+    };
     left_video.addEventListener('play', updateButtonText);
     left_video.addEventListener('pause', updateButtonText);
 }
 """
 
+# --- JavaScript for keyboard vote queueing (A / B / T queue a vote, Enter sends the whole queue) ---
+# Votes are queued against the matches listed in #vote-queue; a queue typed for an older list is dropped.
+vote_keys_js = """
+() => {
+    window.arenaVoteQueue = window.arenaVoteQueue || [];
+    if (window.arenaVoteKeysBound) return;
+    window.arenaVoteKeysBound = true;
+    const outcomes = { a: "A", b: "B", t: "TIE" };
+    const labels = { A: "選項 A", B: "選項 B", TIE: "平手" };
+    window.arenaRenderVoteQueue = (panel) => {
+        const queue = window.arenaVoteQueue;
+        panel.querySelector("#vote-queue-count").textContent = queue.length;
+        panel.querySelectorAll("li[data-slot]").forEach((row) => { row.querySelector(".arena-queued").textContent = labels[queue[row.dataset.slot]] || ""; });
+    };
+    document.addEventListener("keydown", (e) => {
+        // Leave browser shortcuts (Ctrl+T, Cmd+B, ...) alone and do not queue a vote per auto-repeated key.
+        if (e.ctrlKey || e.metaKey || e.altKey || e.repeat) return;
+        if (e.target.closest("input, textarea, select, [contenteditable]")) return;
+        const panel = document.getElementById("vote-queue");
+        if (!panel) return;
+        if (window.arenaVoteQueueMatch !== panel.dataset.match) { window.arenaVoteQueue = []; window.arenaVoteQueueMatch = panel.dataset.match; }
+        const outcome = outcomes[e.key.toLowerCase()];
+        if (outcome) {
+            if (window.arenaVoteQueue.length < Number(panel.dataset.limit) && (outcome !== "TIE" || panel.dataset.allowTie === "1")) {
+                window.arenaVoteQueue.push(outcome);
+                window.arenaRenderVoteQueue(panel);
+            }
+            return;
+        }
+        if (e.key === "Enter" && window.arenaVoteQueue.length) {
+            // Stop Enter from also clicking a focused vote button, which would cast an extra vote.
+            e.preventDefault();
+            if (e.target.closest("button")) e.target.blur();
+            document.getElementById("batch-vote-btn").click();
+        }
+    });
+}
+"""
+flush_vote_queue_js = """
+(queue, state) => [`${window.arenaVoteQueueMatch}|${(window.arenaVoteQueue || []).splice(0).join(",")}`, state]
+"""
+# A click vote or a new upload moves past the matches the queued keys were meant for, so the queue is dropped.
+clear_vote_queue_js = """
+(...args) => {
+    window.arenaVoteQueue = [];
+    const panel = document.getElementById("vote-queue");
+    if (panel && window.arenaRenderVoteQueue) window.arenaRenderVoteQueue(panel);
+    return args;
+}
+"""
+
 # --- ELO Rating Calculation ---
 def calculate_elo(player_a_rating, player_b_rating, result):
+    player_a_rating, player_b_rating = float(player_a_rating), float(player_b_rating)
     k_factor = 32
     expected_a = 1 / (1 + 10**((player_b_rating - player_a_rating) / 400))
     expected_b = 1 - expected_a 
@@ -48,162 +130,307 @@ def calculate_elo(player_a_rating, player_b_rating, result):
     return round(new_rating_a), round(new_rating_b)
 
 # --- Swiss Pairing Algorithm ---
+PAIRING_BLOCK = 32  # players matched together at a time while walking down the score order
+
+def unplayed_edges(ids, scores, played):
+    """Yields (i, j, weight) for every pair in `ids` that has not played yet, weighted by score closeness."""
+    for d in range(1, len(ids)):
+        a, b = ids[:-d], ids[d:]
+        unplayed = ((played[a, b >> 6] >> (b & 63).astype(np.uint64)) & np.uint64(1)) == 0
+        a, b = a[unplayed], b[unplayed]
+        weights = 10000 - (np.abs(scores[a] - scores[b]) * 100).astype(np.int64)
+        yield from zip(a.tolist(), b.tolist(), weights.tolist())
+
+def match_players(ids, scores, played):
+    """Maximum-cardinality, maximum-weight matching over the players in `ids`."""
+    graph = nx.Graph()
+    graph.add_nodes_from(ids.tolist())
+    graph.add_weighted_edges_from(unplayed_edges(ids, scores, played))
+    return [tuple(pair) for pair in nx.max_weight_matching(graph, maxcardinality=True)]
+
+def nearest_unplayed(i, order, rank_pos, played, k):
+    """Returns up to k players that i has not played yet, nearest to i in the score order."""
+    unplayed = ((played[i, order >> 6] >> (order & 63).astype(np.uint64)) & np.uint64(1)) == 0
+    unplayed[rank_pos[i]] = False
+    opponents = order[unplayed]
+    return opponents[np.argsort(np.abs(rank_pos[opponents] - rank_pos[i]), kind="stable")[:k]]
+
+def unmatched(ids, matchups):
+    """Returns the players of `ids` (in order) that appear in none of `matchups`."""
+    paired = np.fromiter((p for pair in matchups for p in pair), dtype=ids.dtype, count=2 * len(matchups))
+    return ids[~np.isin(ids, paired)]
+
 def create_swiss_pairings(state):
-    """Creates pairings for the next round based on Swiss system rules."""
-    players_by_score = defaultdict(list)
-    for p_id, data in state["players"].items():
-        players_by_score[data.get("score", 0)].append(p_id)
-    
-    new_matchups = []
-    sorted_scores = sorted(players_by_score.keys(), reverse=True)
-    
-    unpaired_players = []
-    for score in sorted_scores:
-        bracket = players_by_score[score]
-        random.shuffle(bracket)
-        bracket = unpaired_players + bracket
-        unpaired_players = []
-        
-        if len(bracket) % 2 != 0:
-            unpaired_players.append(bracket.pop(-1))
+    """Creates pairings for the next round from maximum-weight matchings.
 
-        for i in range(0, len(bracket), 2):
-            p1, p2 = bracket[i], bracket[i+1]
-            if not has_played(p1, p2, state):
-                new_matchups.append((p1, p2))
-            else:
-                 unpaired_players.extend([p1, p2])
+    Players are matched a block at a time down the score order; edges are the pairs that
+    have not met yet, weighted by how close their scores are, and anyone left unmatched
+    floats down into the next block. Players still left over at the bottom are repaired
+    locally: they, their nearest not-yet-played opponents and those opponents' partners are
+    rematched together, with the neighbourhood doubling until everyone pairable is paired.
+    Players who have already met everyone else sit out, since their rematch is unavoidable.
+    Only if no local repair works is the whole field matched at once (a networkx blossom over
+    every player, which can take seconds for hundreds of players deep into a long tournament).
+    The bracket shuffle is seeded from the tournament seed and the round number, so a
+    round's pairings are reproducible."""
+    scores, played = state["score"], state["played"]
+    round_rng = np.random.default_rng([state["seed"], state["current_round"]])
+    # Visit players bracket by bracket (highest score first), shuffled within each bracket.
+    order = np.argsort(-scores, kind="stable")
+    boundaries = np.concatenate(([0], np.flatnonzero(np.diff(scores[order])) + 1, [len(order)]))
+    for start, end in zip(boundaries[:-1], boundaries[1:]):
+        round_rng.shuffle(order[start:end])
+    rank_pos = np.empty(len(order), dtype=np.intp)
+    rank_pos[order] = np.arange(len(order))
 
+    new_matchups, carry = [], order[:0]
+    for start in range(0, len(order), PAIRING_BLOCK):
+        block = np.concatenate((carry, order[start:start + PAIRING_BLOCK]))
+        block_matchups = match_players(block, scores, played)
+        new_matchups.extend(block_matchups)
+        carry = unmatched(block, block_matchups)
+
+    reach = 4  # nearest unplayed opponents per leftover player in the first repair attempt
+    while True:
+        pairable = np.fromiter((len(nearest_unplayed(p, order, rank_pos, played, 1)) > 0 for p in carry.tolist()), dtype=bool, count=len(carry))
+        carry = carry[pairable]
+        if len(carry) <= len(order) % 2:
+            break
+        if reach >= 2 * len(order):
+            new_matchups = match_players(order, scores, played)
+            break
+        near = set(carry.tolist()).union(*(nearest_unplayed(p, order, rank_pos, played, reach).tolist() for p in carry.tolist()))
+        new_matchups = [pair for pair in new_matchups if pair[0] not in near and pair[1] not in near]
+        free = unmatched(order, new_matchups)
+        free_matchups = match_players(free, scores, played)
+        new_matchups.extend(free_matchups)
+        carry = unmatched(free, free_matchups)
+        reach *= 2
+
+    new_matchups.sort(key=lambda pair: min(rank_pos[pair[0]], rank_pos[pair[1]]))
     return new_matchups
 
-def has_played(p1, p2, state):
-    """Check if two players have already played."""
-    return (p1, p2) in state["match_history"] or (p2, p1) in state["match_history"]
+def mark_played(i, j, state):
+    """Record a match between two players in the symmetric played bitset."""
+    state["played"][i, j >> 6] |= np.uint64(1 << (j & 63))
+    state["played"][j, i >> 6] |= np.uint64(1 << (i & 63))
 
 # --- Helper Functions ---
-def is_media_file(filename): return any(str(filename).lower().endswith(ext) for ext in SUPPORTED_EXTENSIONS)
-def is_video_file(filename): return any(str(filename).lower().endswith(ext) for ext in ['.mp4', '.mov', '.avi', '.mkv'])
+SUPPORTED_EXTENSIONS = ['.mp4', '.mov', '.avi', '.mkv', '.jpg', '.jpeg', '.png', '.bmp', '.webp']
+MEDIA_EXT = tuple(SUPPORTED_EXTENSIONS)
+VIDEO_EXT = ('.mp4', '.mov', '.avi', '.mkv')
+def is_media_file(filename): return str(filename).lower().endswith(MEDIA_EXT)
+def is_video_file(filename): return str(filename).lower().endswith(VIDEO_EXT)
 
 # --- Core Logic ---
+def elo_ranking_order(state, top_k=None):
+    """Returns player ids ordered by ELO (best first), limited to the first top_k if given."""
+    k = len(state["rank"]) if top_k is None else min(top_k, len(state["rank"]))
+    return np.fromiter((i for _, i in islice(state["rank"], k)), dtype=np.intp, count=k)
+
 def start_tournament(files_list, tournament_type, total_rounds):
     if not files_list:
         gr.Warning("請選擇或拖放一個資料夾！")
-        return (None,) + (gr.update(),) * 10
+        return (None,) + NOOP12
 
     files = [f.name for f in files_list if is_media_file(f.name)]
     if len(files) < 2:
         gr.Warning("資料夾中需要至少 2 個支援的媒體檔案才能開始比賽！")
-        return (None, gr.update(value="錯誤：有效的媒體檔案數量不足。")) + (gr.update(visible=False),) * 9
+        return (None, gr.update(value="錯誤：有效的媒體檔案數量不足。")) + HIDE11
 
-    state = {"mode": tournament_type, "original_filenames": {path: Path(path).name for path in files}, "players": {}, "matchups": []}
+    n = len(files)
+    state = {"mode": tournament_type, "files": np.array(files, dtype=object), "names": np.array([Path(path).name for path in files], dtype=object),
+             "is_video": np.fromiter((is_video_file(path) for path in files), dtype=bool, count=n), "players": {}, "matchups": []}
 
     if tournament_type == "單淘汰賽":
-        random.shuffle(files)
-        state.update({"players": {f: {"status": "active"} for f in files}, "matchups": list(zip(files[::2], files[1::2])), "current_match_index": 0, "round": 1})
-        if len(files) % 2 != 0: state["players"][files[-1]]["status"] = "winner"
+        perm = rng.permutation(n)
+        state.update({"players": {i: {"status": "active"} for i in range(n)}, "matchups": perm[: n - n % 2].reshape(-1, 2).astype(np.int32), "elim_order": [], "current_match_index": 0, "round": 1})
+        if n % 2 != 0: state["players"][int(perm[-1])]["status"] = "winner"
     elif tournament_type == "循環評分賽 (ELO)":
         state.update({
-            "players": {f: {"elo": 1500, "score": 0, "matches": 0} for f in files},
+            "elo": np.full(n, 1500, dtype=np.int32), "score": np.zeros(n, np.float32), "matches": np.zeros(n, np.int32),
+            "rank": SortedList((-1500, i) for i in range(n)),
             "total_rounds": int(total_rounds), "current_round": 1,
-            "match_history": set(), "matchups_this_round": [], "current_match_index": 0
+            "played": np.zeros((n, (n + 63) // 64), dtype=np.uint64), "matchups_this_round": [], "current_match_index": 0,
+            "ranking_stale": True, "seed": int(rng.integers(2**63)), "ranking_csv": None
         })
+        top = np.arange(min(RANKING_TOP_K, n))  # fancy indexing copies, so the refresh never writes through to the state arrays
+        state["ranking_df"] = pd.DataFrame({"名稱": state["names"][top], "ELO分數": state["elo"][top], "積分": state["score"][top], "已賽場次": state["matches"][top]})
         state["matchups_this_round"] = create_swiss_pairings(state)
     
     return display_match(state)
 
-def display_match(state):
-    if not isinstance(state, dict): return (None, gr.update(value="發生內部錯誤，請重試。")) + (gr.update(),) * 9
+def advance_tournament(state):
+    """Moves the tournament on to its next playable match, pairing a new round when the current one is finished."""
+    if state["mode"] == "循環評分賽 (ELO)":
+        if state["current_round"] <= state["total_rounds"] and state["current_match_index"] >= len(state["matchups_this_round"]):
+            state["current_round"] += 1
+            state["ranking_stale"] = True
+            if state["current_round"] > state["total_rounds"]:
+                return
+            state["matchups_this_round"] = create_swiss_pairings(state)
+            state["current_match_index"] = 0
+            if not state["matchups_this_round"]:
+                state["pairings_exhausted"] = True
+                state["current_round"] = state["total_rounds"] + 1
 
+    elif state["mode"] == "單淘汰賽":
+        if state["current_match_index"] >= len(state["matchups"]):
+            winners = [i for i, d in state["players"].items() if d["status"] == "winner"]
+            if len(winners) == 1:
+                return
+            state["round"] += 1; state["current_match_index"] = 0
+            for i in winners: state["players"][i]["status"] = "active"
+            perm, m = rng.permutation(winners), len(winners)
+            state["matchups"] = perm[: m - m % 2].reshape(-1, 2).astype(np.int32)
+            if m % 2 != 0: state["players"][int(perm[-1])]["status"] = "winner"
+
+def has_pending_match(state):
+    """Check if the (already advanced) tournament is waiting for a vote."""
+    if state["mode"] == "循環評分賽 (ELO)":
+        return state["current_round"] <= state["total_rounds"] and state["current_match_index"] < len(state["matchups_this_round"])
+    return state["current_match_index"] < len(state["matchups"])
+
+def current_match_key(state):
+    """Identifies the match on screen; the keyboard vote queue sends it back so stale queues are rejected."""
+    round_no = state["current_round"] if state["mode"] == "循環評分賽 (ELO)" else state["round"]
+    return f"{round_no}-{state['current_match_index']}"
+
+def render_vote_queue(state):
+    """Lists the current match and the next ones of this round, so every queued keyboard vote targets a shown pair."""
+    allow_tie = state["mode"] == "循環評分賽 (ELO)"
+    matchups = state["matchups_this_round"] if allow_tie else state["matchups"]
+    start = state["current_match_index"]
+    upcoming = matchups[start:start + VOTE_QUEUE_LIMIT]
+    names = state["names"]
+    rows = "".join(f'<li data-slot="{k}">{html.escape(names[i1])} vs {html.escape(names[i2])} <b class="arena-queued"></b></li>' for k, (i1, i2) in enumerate(upcoming))
+    keys, choices = ("A / B / T", "選項 A、選項 B、平手") if allow_tie else ("A / B", "選項 A、選項 B")
+    return gr.update(value=f'<div id="vote-queue" data-match="{current_match_key(state)}" data-limit="{len(upcoming)}" data-allow-tie="{int(allow_tie)}">'
+                           f'<p>鍵盤快速投票：按 {keys} 依序為下列對戰排入{choices}，按 Enter 一次送出。已排入 <span id="vote-queue-count">0</span>/{len(upcoming)} 票。</p>'
+                           f'<ol>{rows}</ol></div>', visible=True)
+
+def display_match(state):
+    advance_tournament(state)
     mode = state["mode"]
-    updates = [gr.update()] * 11
-    for i in range(2, 11): updates[i] = gr.update(visible=False)
+    updates = [NOOP, NOOP] + [HIDE] * 11
     
     def set_updates(info, l_vis=False, t_vis=False, r_vis=False, c_vis=False):
         updates[1] = gr.update(value=info)
-        updates[4], updates[5], updates[6] = gr.update(visible=l_vis), gr.update(visible=t_vis), gr.update(visible=r_vis)
-        updates[10] = gr.update(visible=c_vis)
+        updates[4], updates[5], updates[6] = SHOW if l_vis else HIDE, SHOW if t_vis else HIDE, SHOW if r_vis else HIDE
+        updates[10] = SHOW if c_vis else HIDE
 
     if mode == "循環評分賽 (ELO)":
         if state["current_round"] > state["total_rounds"]:
-            set_updates("🎉 ELO 循環賽結束！這是最終排名。🎉")
-        elif state["current_match_index"] >= len(state["matchups_this_round"]):
-            state["current_round"] += 1
-            if state["current_round"] > state["total_rounds"]:
-                return display_match(state)
-            state["matchups_this_round"] = create_swiss_pairings(state)
-            state["current_match_index"] = 0
-            if not state["matchups_this_round"]:
-                set_updates("所有可能的配對均已完成，比賽結束！")
-                state["current_round"] = state["total_rounds"] + 1
-        
-        if state["current_round"] <= state["total_rounds"] and state["matchups_this_round"]:
-            match = state["matchups_this_round"][state["current_match_index"]]
-            p1, p2 = match
+            set_updates("所有可能的配對均已完成，比賽結束！" if state.get("pairings_exhausted") else "🎉 ELO 循環賽結束！這是最終排名。🎉")
+            state["ranking_stale"] = True
+        else:
+            i1, i2 = state["matchups_this_round"][state["current_match_index"]]
+            p1, p2 = state["files"][i1], state["files"][i2]
             info_text = f"第 {state['current_round']}/{state['total_rounds']} 輪 - 第 {state['current_match_index'] + 1}/{len(state['matchups_this_round'])} 場"
-            set_updates(info_text, True, True, True, is_video_file(p1) or is_video_file(p2))
+            set_updates(info_text, True, True, True, bool(state["is_video"][i1] | state["is_video"][i2]))
             updates[2], updates[3] = gr.update(value=p1, label="選項 A", visible=True), gr.update(value=p2, label="選項 B", visible=True)
+            updates[12] = render_vote_queue(state)
 
-        ranking_df = pd.DataFrame([{"名稱": state["original_filenames"].get(p, "N/A"), "ELO分數": d["elo"], "積分": d["score"], "已賽場次": d["matches"]} for p, d in state["players"].items()]).sort_values(by="ELO分數", ascending=False).reset_index(drop=True)
-        updates[7] = gr.update(value=ranking_df, visible=True)
+        # The ranking is only refreshed on round boundaries; within a round the table keeps its last value.
+        if state["ranking_stale"]:
+            ranking_df = state["ranking_df"]
+            order = elo_ranking_order(state, len(ranking_df))
+            ranking_df.loc[:, "名稱"], ranking_df.loc[:, "ELO分數"] = state["names"][order], state["elo"][order]
+            ranking_df.loc[:, "積分"], ranking_df.loc[:, "已賽場次"] = state["score"][order], state["matches"][order]
+            state["ranking_stale"] = False
+            updates[7] = gr.update(value=ranking_df, visible=True)
+        else:
+            updates[7] = NOOP
+        updates[11] = SHOW
 
     elif mode == "單淘汰賽":
-        if state["current_match_index"] >= len(state["matchups"]):
-            winners = [p for p, d in state["players"].items() if d["status"] == "winner"]
-            if len(winners) == 1:
-                winner_file, winner_name = winners[0], state["original_filenames"].get(winners[0], "N/A")
-                
-                # **[FIXED]** Assign the winner a higher rank order than any loser.
-                state["players"][winner_file]['eliminated_in_round'] = state["round"] + 1
-                
-                ranking_data = [{"名稱": state["original_filenames"].get(p, "N/A"), "rank_order": d.get("eliminated_in_round", 0)} for p,d in state["players"].items()]
-                ranking_df = pd.DataFrame(ranking_data).sort_values(by="rank_order", ascending=False)
-                ranking_df["排名"] = range(1, len(ranking_df) + 1)
-                set_updates("🎉 總冠軍出爐！ 🎉")
-                updates[7] = gr.update(value=ranking_df[["排名", "名稱"]], visible=True)
-                if is_video_file(winner_file): updates[8] = gr.update(value=winner_file, label=f"總冠軍：{winner_name}", visible=True)
-                else: updates[9] = gr.update(value=winner_file, label=f"總冠軍：{winner_name}", visible=True)
-                return (state,) + tuple(updates[1:])
-
-            state["round"] += 1; state["current_match_index"] = 0; random.shuffle(winners)
-            for p in winners: state["players"][p]["status"] = "active"
-            state["matchups"] = list(zip(winners[::2], winners[1::2]))
-            if len(winners) % 2 != 0: state["players"][winners[-1]]["status"] = "winner"
-        
-        if state["current_match_index"] < len(state["matchups"]):
-            p1, p2 = state["matchups"][state["current_match_index"]]
+        if not has_pending_match(state):
+            winner = next(i for i, d in state["players"].items() if d["status"] == "winner")
+            winner_file, winner_name = state["files"][winner], state["names"][winner]
+
+            # Players are eliminated in round order, so the reversed elimination order (champion first) is the ranking.
+            ranking_ids = np.array(state["elim_order"] + [winner])[::-1]
+            ranking_df = pd.DataFrame({"排名": np.arange(1, len(ranking_ids) + 1), "名稱": state["names"][ranking_ids]})
+            set_updates("🎉 總冠軍出爐！ 🎉")
+            updates[7] = gr.update(value=ranking_df, visible=True)
+            if state["is_video"][winner]: updates[8] = gr.update(value=winner_file, label=f"總冠軍：{winner_name}", visible=True)
+            else: updates[9] = gr.update(value=winner_file, label=f"總冠軍：{winner_name}", visible=True)
+        else:
+            i1, i2 = state["matchups"][state["current_match_index"]]
+            p1, p2 = state["files"][i1], state["files"][i2]
             info_text = f"第 {state['round']} 輪 - 第 {state['current_match_index'] + 1}/{len(state['matchups'])} 場"
-            set_updates(info_text, True, False, True, is_video_file(p1) or is_video_file(p2))
+            set_updates(info_text, True, False, True, bool(state["is_video"][i1] | state["is_video"][i2]))
             updates[2], updates[3] = gr.update(value=p1, label="選項 A", visible=True), gr.update(value=p2, label="選項 B", visible=True)
+            updates[12] = render_vote_queue(state)
 
     return (state,) + tuple(updates[1:])
 
-def vote(outcome, state):
-    if not isinstance(state, dict): return (state,) + (gr.update(),) * 10
+def record_vote(outcome, state):
+    """Applies one vote to the current match without rendering anything."""
     mode = state["mode"]
     
     if mode == "循環評分賽 (ELO)":
-        p1, p2 = state["matchups_this_round"][state["current_match_index"]]
-        state["match_history"].add(tuple(sorted((p1, p2)))) # Record match
+        i1, i2 = state["matchups_this_round"][state["current_match_index"]]
+        mark_played(i1, i2, state)
         if outcome == 'A': result, score1, score2 = 1.0, 1.0, 0.0
         elif outcome == 'B': result, score1, score2 = 0.0, 0.0, 1.0
         else: result, score1, score2 = 0.5, 0.5, 0.5
         
-        elo1, elo2 = calculate_elo(state["players"][p1]["elo"], state["players"][p2]["elo"], result)
-        state["players"][p1].update({"elo": elo1, "score": state["players"][p1]["score"] + score1, "matches": state["players"][p1]["matches"] + 1})
-        state["players"][p2].update({"elo": elo2, "score": state["players"][p2]["score"] + score2, "matches": state["players"][p2]["matches"] + 1})
+        elo1, elo2 = calculate_elo(state["elo"][i1], state["elo"][i2], result)
+        state["rank"].remove((-int(state["elo"][i1]), i1)); state["rank"].remove((-int(state["elo"][i2]), i2))
+        state["rank"].update(((-elo1, i1), (-elo2, i2)))
+        state["elo"][i1], state["elo"][i2] = elo1, elo2
+        state["score"][i1] += score1; state["score"][i2] += score2
+        state["matches"][i1] += 1; state["matches"][i2] += 1
         state["current_match_index"] += 1
 
     elif mode == "單淘汰賽" and outcome != 'TIE':
         winner_idx = 0 if outcome == 'A' else 1
-        winner, loser = state["matchups"][state["current_match_index"]][winner_idx], state["matchups"][state["current_match_index"]][1 - winner_idx]
+        winner, loser = (int(i) for i in state["matchups"][state["current_match_index"]][[winner_idx, 1 - winner_idx]])
         state["players"][winner]["status"] = "winner"
-        state["players"][loser].update({"status": "eliminated", "eliminated_in_round": state["round"]})
+        state["players"][loser]["status"] = "eliminated"
+        state["elim_order"].append(loser)
         state["current_match_index"] += 1
+
+def vote(outcome, state):
+    record_vote(outcome, state)
+    return display_match(state)
+
+def vote_batch(queue, state):
+    """Applies a keyboard vote queue ("<match key>|A,B,TIE") in order and renders only the final match.
+
+    The queue is ignored unless it was typed against the match on screen, and it never runs past the
+    matches listed in the queue panel (at most VOTE_QUEUE_LIMIT, never into the next round)."""
+    match_key, _, outcomes = queue.partition("|")
+    allow_tie = state["mode"] == "循環評分賽 (ELO)"
+    if match_key == current_match_key(state):
+        for outcome in islice(outcomes.split(","), VOTE_QUEUE_LIMIT):
+            if not has_pending_match(state) or outcome not in ("A", "B", "TIE") or (outcome == "TIE" and not allow_tie): break
+            record_vote(outcome, state)
     return display_match(state)
 
+def export_full_ranking(state):
+    if state is None or state["mode"] != "循環評分賽 (ELO)": return HIDE
+    order = elo_ranking_order(state)
+    ranking_df = pd.DataFrame({"排名": np.arange(1, len(order) + 1), "名稱": state["names"][order], "ELO分數": state["elo"][order], "積分": state["score"][order], "已賽場次": state["matches"][order]})
+    # One CSV per tournament, overwritten on every export, so repeated clicks do not pile up temp files.
+    if state["ranking_csv"] is None:
+        fd, state["ranking_csv"] = tempfile.mkstemp(suffix=".csv", prefix="elo_ranking_")
+        os.close(fd)
+    ranking_df.to_csv(state["ranking_csv"], index=False, encoding="utf-8-sig")
+    return gr.update(value=state["ranking_csv"], visible=True)
+
 # --- Gradio UI ---
-SUPPORTED_EXTENSIONS = ['.mp4', '.mov', '.avi', '.mkv', '.jpg', '.jpeg', '.png', '.bmp', '.webp']
-with gr.Blocks(theme=gr.themes.Soft(), css="footer {display: none !important}") as demo:
+def requires_tournament(handler):
+    """Wraps a vote handler bound to Gradio so it leaves every output unchanged until a tournament has started."""
+    @functools.wraps(handler)
+    def guarded(*args):
+        state = args[-1]
+        if state is None: return (state,) + NOOP12
+        return handler(*args)
+    return guarded
+
+with gr.Blocks(theme=gr.themes.Soft(), css="footer, #batch-vote-btn {display: none !important}") as demo:
     state = gr.State()
     gr.Markdown("# 🏆 媒體競技場 (專家模式) 🏆")
     with gr.Row():
@@ -214,7 +441,7 @@ with gr.Blocks(theme=gr.themes.Soft(), css="footer {display: none !important}")
             folder_selector = gr.File(label="選擇或拖放媒體資料夾", file_count="directory", file_types=["video", "image"])
 
     def toggle_elo_rounds_visibility(choice):
-        return gr.update(visible=(choice == "循環評分賽 (ELO)"))
+        return SHOW if choice == "循環評分賽 (ELO)" else HIDE
     tournament_type_selector.change(fn=toggle_elo_rounds_visibility, inputs=tournament_type_selector, outputs=elo_rounds_input)
 
     gr.Markdown("---")
@@ -227,17 +454,30 @@ with gr.Blocks(theme=gr.themes.Soft(), css="footer {display: none !important}")
         left_btn = gr.Button("👈 選擇 A", visible=False, variant="secondary")
         tie_btn = gr.Button("平手", visible=False)
         right_btn = gr.Button("選擇 B 👉", visible=False, variant="secondary")
+    vote_queue_panel = gr.HTML(visible=False)
+    vote_queue = gr.Textbox(visible=False)
+    batch_vote_btn = gr.Button("送出排隊投票", elem_id="batch-vote-btn")
     gr.Markdown("---"); gr.Markdown("### 排名")
     ranking_table = gr.DataFrame(headers=["排名", "名稱", "ELO分數", "積分", "已賽場次"], visible=False, interactive=False)
+    with gr.Row():
+        export_ranking_btn = gr.Button("匯出完整 ELO 排名", visible=False, variant="secondary")
+        full_ranking_file = gr.File(label="完整排名 (CSV)", visible=False, interactive=False)
     final_winner_video = gr.Video(label="總冠軍", visible=False, interactive=False)
     final_winner_image = gr.Image(label="總冠軍", visible=False, interactive=False)
 
-    outputs_list = [state, info_text, left_media_display, right_media_display, left_btn, tie_btn, right_btn, ranking_table, final_winner_video, final_winner_image, custom_video_controls]
+    outputs_list = [state, info_text, left_media_display, right_media_display, left_btn, tie_btn, right_btn, ranking_table, final_winner_video, final_winner_image, custom_video_controls, export_ranking_btn, vote_queue_panel]
     
-    folder_selector.upload(fn=start_tournament, inputs=[folder_selector, tournament_type_selector, elo_rounds_input], outputs=outputs_list).then(fn=None, inputs=None, outputs=None, js=js_script)
-    left_btn.click(fn=lambda s: vote('A', s), inputs=[state], outputs=outputs_list).then(fn=None, inputs=None, outputs=None, js=js_script)
-    tie_btn.click(fn=lambda s: vote('TIE', s), inputs=[state], outputs=outputs_list).then(fn=None, inputs=None, outputs=None, js=js_script)
-    right_btn.click(fn=lambda s: vote('B', s), inputs=[state], outputs=outputs_list).then(fn=None, inputs=None, outputs=None, js=js_script)
+    def bind_video_controls(event):
+        """Runs the custom video control script once the event's outputs are rendered."""
+        return event.then(fn=None, inputs=None, outputs=None, js=js_script)
+
+    bind_video_controls(folder_selector.upload(fn=start_tournament, inputs=[folder_selector, tournament_type_selector, elo_rounds_input], outputs=outputs_list, js=clear_vote_queue_js))
+    bind_video_controls(left_btn.click(fn=requires_tournament(lambda s: vote('A', s)), inputs=[state], outputs=outputs_list, js=clear_vote_queue_js))
+    bind_video_controls(tie_btn.click(fn=requires_tournament(lambda s: vote('TIE', s)), inputs=[state], outputs=outputs_list, js=clear_vote_queue_js))
+    bind_video_controls(right_btn.click(fn=requires_tournament(lambda s: vote('B', s)), inputs=[state], outputs=outputs_list, js=clear_vote_queue_js))
+    bind_video_controls(batch_vote_btn.click(fn=requires_tournament(vote_batch), inputs=[vote_queue, state], outputs=outputs_list, js=flush_vote_queue_js))
+    export_ranking_btn.click(fn=export_full_ranking, inputs=[state], outputs=full_ranking_file)
+    demo.load(fn=None, inputs=None, outputs=None, js=vote_keys_js)
 
 if __name__ == "__main__":
     demo.launch()